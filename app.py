@@ -1,6 +1,9 @@
 # app.py
 import streamlit as st
+import pandas as pd
 from pathlib import Path
+import io
+import shutil
 import tempfile
 import zipfile
 
@@ -10,8 +13,13 @@ from compare_tmdl import (
     list_tmdl_files,
     parse_tmdl_file,
     compare_models,
+    iter_report_rows,
+    export_report,
+    DETAIL_KINDS,
+    REPORT_COLUMNS,
 )
 from merge_tmdl import merge_models
+from upload_zip import save_and_extract_zip, is_tmdl_member, is_definition_member
 
 # ---------------------
 # CONFIGURAÇÃO INICIAL
@@ -110,14 +118,37 @@ tab1, tab2 = st.tabs(["🔍 Comparar Modelos", "🧩 Mesclar Modelos"])
 # ---------------------
 # FUNÇÃO DE UPLOAD E EXTRAÇÃO
 # ---------------------
-def save_and_extract_zip(uploaded_file):
-    tmp_dir = Path(tempfile.mkdtemp())
-    zip_path = tmp_dir / uploaded_file.name
-    with open(zip_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-        zip_ref.extractall(tmp_dir)
-    return tmp_dir
+# Extrações ficam em session_state por file_id e são reaproveitadas entre reruns;
+# as de uploads que não estão mais presentes são apagadas ao final do script.
+extractions = st.session_state.setdefault("extractions", {})
+active_extractions = set()
+
+def extract_upload(uploaded_file, member_filter=is_tmdl_member):
+    """
+    Extrai o upload (uma única vez por arquivo) com limites de tamanho; em caso de erro
+    mostra a mensagem e retorna None. O diretório retornado deve ser tratado como somente leitura.
+    """
+    if not uploaded_file:
+        return None
+    cache_key = (uploaded_file.file_id, member_filter.__name__)
+    active_extractions.add(cache_key)
+    if cache_key not in extractions:
+        try:
+            extractions[cache_key] = save_and_extract_zip(uploaded_file, member_filter=member_filter)
+        except (ValueError, zipfile.BadZipFile) as e:
+            extractions[cache_key] = ValueError(f"Não foi possível processar '{uploaded_file.name}': {e}")
+    result = extractions[cache_key]
+    if isinstance(result, Exception):
+        st.error(str(result))
+        return None
+    return result
+
+def cleanup_extractions():
+    for cache_key in list(extractions):
+        if cache_key not in active_extractions:
+            result = extractions.pop(cache_key)
+            if isinstance(result, Path):
+                shutil.rmtree(result, ignore_errors=True)
 
 
 # ---------------------
@@ -133,13 +164,22 @@ with tab1:
     with col2:
         uploaded_b = st.file_uploader("Modelo B (.zip)", type=["zip"], key="upload_b_compare")
 
-    model_a_root = save_and_extract_zip(uploaded_a) if uploaded_a else None
-    model_b_root = save_and_extract_zip(uploaded_b) if uploaded_b else None
+    model_a_root = extract_upload(uploaded_a)
+    model_b_root = extract_upload(uploaded_b)
 
-    comparison_text = ""
+    # Relatório anterior deixa de valer quando A ou B é trocado ou removido
+    compare_files = tuple(f.file_id if f else None for f in (uploaded_a, uploaded_b))
+    if st.session_state.get("compare_files") != compare_files:
+        st.session_state.pop("compare_report", None)
+        st.session_state.pop("compare_rows", None)
+        st.session_state.pop("compare_exports", None)
+    st.session_state["compare_files"] = compare_files
 
     compare_button = st.button("🔍 Comparar Modelos", use_container_width=True)
     if compare_button:
+        st.session_state.pop("compare_report", None)
+        st.session_state.pop("compare_rows", None)
+        st.session_state.pop("compare_exports", None)
         if not model_a_root or not model_b_root:
             st.error("Envie os dois arquivos ZIP antes de comparar.")
         else:
@@ -162,82 +202,85 @@ with tab1:
                         source_parsed = {f.stem: parse_tmdl_file(f) for f in a_files}
                         target_parsed = {f.stem: parse_tmdl_file(f) for f in b_files}
 
+                        # Guarda o relatório e a tabela de alterações para os reruns (filtros/paginação)
                         report = compare_models(source_parsed, target_parsed)
-                        counts = report["counts"]
-
-                        st.success("✅ Comparação concluída!")
-                        st.write(f"Tabelas no Modelo A: {counts['source_total']}")
-                        st.write(f"Tabelas no Modelo B: {counts['target_total']}")
-                        st.write(f"✅ Iguais: {counts['identical']}")
-                        st.write(f"⚠️ Diferentes: {counts['different']}")
-                        st.write(f"➕ Apenas no A: {counts['only_in_source']}")
-                        st.write(f"➖ Apenas no B: {counts['only_in_target']}")
-
-                    # Detalhes
-                    if lists := report.get("lists"):
-                        if lists["only_in_source"]:
-                            st.subheader("Tabelas apenas no Modelo A")
-                            for t in lists["only_in_source"]:
-                                st.write("-", t)
-                        if lists["only_in_target"]:
-                            st.subheader("Tabelas apenas no Modelo B")
-                            for t in lists["only_in_target"]:
-                                st.write("-", t)
-
-                    if report["details"]:
-                        st.subheader("Diferenças detalhadas por tabela")
-                        for t, d in report["details"].items():
-                            st.markdown(f"**{t}**")
-                            if d.get("cols_only_in_source"):
-                                st.write("Colunas só no A:", d["cols_only_in_source"])
-                            if d.get("cols_only_in_target"):
-                                st.write("Colunas só no B:", d["cols_only_in_target"])
-                            if d.get("measures_only_in_source"):
-                                st.write("Medidas só no A:", d["measures_only_in_source"])
-                            if d.get("measures_only_in_target"):
-                                st.write("Medidas só no B:", d["measures_only_in_target"])
-                            if d.get("textual_diff_snippet"):
-                                st.write("Trecho textual diff disponível (resumido)")
-
-                    # Gerar texto para download
-                    lines = []
-                    lines.append(f"Tabelas no Modelo A: {counts['source_total']}")
-                    lines.append(f"Tabelas no Modelo B: {counts['target_total']}")
-                    lines.append(f"Iguais: {counts['identical']}")
-                    lines.append(f"Diferentes: {counts['different']}")
-                    lines.append(f"Apenas no A: {counts['only_in_source']}")
-                    lines.append(f"Apenas no B: {counts['only_in_target']}\n")
-
-                    if lists := report.get("lists"):
-                        if lists["only_in_source"]:
-                            lines.append("Tabelas apenas no Modelo A:")
-                            lines.extend(f"  - {t}" for t in lists["only_in_source"])
-                        if lists["only_in_target"]:
-                            lines.append("Tabelas apenas no Modelo B:")
-                            lines.extend(f"  - {t}" for t in lists["only_in_target"])
-
-                    if report["details"]:
-                        lines.append("\nDiferenças detalhadas por tabela:")
-                        for t, d in report["details"].items():
-                            lines.append(f"- {t}:")
-                            if d.get("cols_only_in_source"):
-                                lines.append(f"    • Colunas só no A: {', '.join(d['cols_only_in_source'])}")
-                            if d.get("cols_only_in_target"):
-                                lines.append(f"    • Colunas só no B: {', '.join(d['cols_only_in_target'])}")
-                            if d.get("measures_only_in_source"):
-                                lines.append(f"    • Medidas só no A: {', '.join(d['measures_only_in_source'])}")
-                            if d.get("measures_only_in_target"):
-                                lines.append(f"    • Medidas só no B: {', '.join(d['measures_only_in_target'])}")
-
-                    comparison_text = "\n".join(lines)
-                    st.session_state["ready_to_merge"] = True
-
-    if comparison_text:
+                        st.session_state["compare_report"] = report
+                        st.session_state["compare_rows"] = pd.DataFrame(
+                            list(iter_report_rows(report)), columns=REPORT_COLUMNS
+                        )
+                        st.session_state["compare_exports"] = {}
+                        st.session_state["ready_to_merge"] = True
+
+    if report := st.session_state.get("compare_report"):
+        counts = report["counts"]
+        rows = st.session_state["compare_rows"]
+
+        st.success("✅ Comparação concluída!")
+        m1, m2, m3, m4, m5, m6 = st.columns(6)
+        m1.metric("Tabelas no Modelo A", counts["source_total"])
+        m2.metric("Tabelas no Modelo B", counts["target_total"])
+        m3.metric("✅ Iguais", counts["identical"])
+        m4.metric("⚠️ Diferentes", counts["different"])
+        m5.metric("➕ Apenas no A", counts["only_in_source"])
+        m6.metric("➖ Apenas no B", counts["only_in_target"])
+
+        if not rows.empty:
+            st.subheader("Alterações por tabela")
+            f1, f2 = st.columns([2, 1])
+            with f1:
+                kinds = st.multiselect("Tipo de alteração", sorted(rows["tipo"].unique()), key="compare_kinds")
+            with f2:
+                search = st.text_input("Buscar tabela", key="compare_search")
+
+            filtered = rows
+            if kinds:
+                filtered = filtered[filtered["tipo"].isin(kinds)]
+            if search:
+                filtered = filtered[filtered["tabela"].str.contains(search, case=False, regex=False)]
+
+            p1, p2 = st.columns(2)
+            with p1:
+                page_size = st.selectbox("Linhas por página", [25, 50, 100, 250], key="compare_page_size")
+            total_pages = max(1, -(-len(filtered) // page_size))
+            if st.session_state.get("compare_page", 1) > total_pages or "compare_page" not in st.session_state:
+                st.session_state["compare_page"] = 1
+            with p2:
+                page = st.number_input(f"Página (de {total_pages})", 1, total_pages, key="compare_page")
+
+            page_rows = filtered.iloc[(page - 1) * page_size: page * page_size]
+            st.dataframe(page_rows, use_container_width=True, hide_index=True)
+            st.caption(f"{len(filtered)} de {len(rows)} linhas")
+
+            # Detalhes só são montados para a tabela escolhida
+            detail_table = st.selectbox(
+                "Ver detalhes da tabela",
+                page_rows["tabela"].unique(),
+                index=None,
+                placeholder="Selecione uma tabela desta página",
+                key="compare_detail_table",
+            )
+            if detail_table and (d := report["details"].get(detail_table)):
+                with st.expander(f"Detalhes: {detail_table}", expanded=True):
+                    for kind, key in DETAIL_KINDS:
+                        if d.get(key):
+                            st.write(f"{kind}:", d[key])
+                    if d.get("textual_diff_snippet"):
+                        diff_lines = (l.rstrip("\n") for l in d["textual_diff_snippet"])
+                        st.code("\n".join(diff_lines), language="diff")
+            elif detail_table:
+                st.info("Tabela presente em apenas um dos modelos; não há detalhes adicionais.")
+
+        # O arquivo de download é gerado apenas no formato escolhido, uma vez por comparação
+        fmt = st.radio("Formato do relatório", ["txt", "json", "csv"], horizontal=True, key="compare_fmt")
+        exports = st.session_state.setdefault("compare_exports", {})
+        if fmt not in exports:
+            exports[fmt] = export_report(report, fmt)
+        data, file_name, mime = exports[fmt]
         st.download_button(
             "📄 Baixar Resultado da Comparação",
-            data=comparison_text,
-            file_name="Comparacao_Modelos.txt",
-            mime="text/plain",
+            data=data,
+            file_name=file_name,
+            mime=mime,
             use_container_width=True
         )
     st.markdown('</div>', unsafe_allow_html=True)
@@ -256,27 +299,56 @@ with tab2:
     with col2:
         uploaded_b_merge = st.file_uploader("Modelo B (.zip)", type=["zip"], key="upload_b_merge")
 
-    model_a_root = save_and_extract_zip(uploaded_a_merge) if uploaded_a_merge else None
-    model_b_root = save_and_extract_zip(uploaded_b_merge) if uploaded_b_merge else None
+    uploaded_base_merge = st.file_uploader(
+        "Modelo Base (.zip, opcional) — ancestral comum de A e B para merge de três vias",
+        type=["zip"],
+        key="upload_base_merge",
+    )
+
+    # De B extrai-se toda a pasta definition/, que é devolvida no .zip atualizado;
+    # cada merge trabalha sobre uma cópia para não alterar a extração reaproveitada
+    model_a_root = extract_upload(uploaded_a_merge)
+    model_b_root = extract_upload(uploaded_b_merge, member_filter=is_definition_member)
+    model_base_root = extract_upload(uploaded_base_merge)
 
     if st.button("🚀 Executar Merge", use_container_width=True):
         if not model_a_root or not model_b_root:
             st.error("Envie os dois arquivos ZIP antes de mesclar.")
         else:
             with st.spinner("Mesclando modelos..."):
-                result = merge_models(model_a_root, model_b_root)
-                st.success("✅ Merge concluído com sucesso!")
-                st.write(f"Tabelas novas: {len(result['novas'])}", result['novas'])
-                st.write(f"Tabelas atualizadas: {len(result['atualizadas'])}", result['atualizadas'])
-
-                b_folder = Path(result["destino"]).parent
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".zip") as tmp_zip:
-                    with zipfile.ZipFile(tmp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                work_dir = Path(tempfile.mkdtemp())
+                result = None
+                try:
+                    shutil.copytree(model_b_root, work_dir, dirs_exist_ok=True)
+                    result = merge_models(model_a_root, work_dir, base_root=model_base_root)
+
+                    b_folder = Path(result["destino"]).parent
+                    zip_buffer = io.BytesIO()
+                    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
                         for f in b_folder.rglob("*"):
                             zipf.write(f, f.relative_to(b_folder))
+                    zip_bytes = zip_buffer.getvalue()
+                except FileNotFoundError as e:
+                    st.error(f"{e}.")
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
 
-                with open(tmp_zip.name, "rb") as f:
-                    zip_bytes = f.read()
+            if result:
+                st.success("✅ Merge concluído com sucesso!")
+                st.write(f"Tabelas novas: {len(result['novas'])}", result['novas'])
+                st.write(f"Tabelas atualizadas: {len(result['atualizadas'])}", result['atualizadas'])
+                if result["conflitos"]:
+                    st.warning(
+                        f"⚠️ Conflitos em {len(result['conflitos'])} tabela(s): "
+                        "A e B alteraram o mesmo bloco. Foi mantida a versão de B."
+                    )
+                    st.write(result["conflitos"])
+                if result["removidas"]:
+                    st.info(
+                        f"Tabelas removidas em A e não alteradas em B ({len(result['removidas'])}): "
+                        "não foram apagadas automaticamente; remova-as no Power BI se desejar."
+                    )
+                    st.write(result["removidas"])
 
                 st.download_button(
                     "📥 Baixar Modelo B Atualizado (ZIP)",
@@ -288,6 +360,9 @@ with tab2:
     st.markdown('</div>', unsafe_allow_html=True)
 
 
+cleanup_extractions()
+
+
 # ---------------------
 # RODAPÉ
 # ---------------------
@@ -5,6 +5,8 @@ Permite ser usado via linha de comando OU importado como módulo no Streamlit.
 
 import os
 import sys
+import io
+import csv
 import json
 import difflib
 import re
@@ -149,6 +151,77 @@ def compare_models(source_files, target_files):
         "details": diffs_details
     }
 
+# ----------------------------
+# Relatório em formato tabular / exportação
+# ----------------------------
+
+# (tipo de alteração, chave em report["details"])
+DETAIL_KINDS = [
+    ("Colunas só no A", "cols_only_in_source"),
+    ("Colunas só no B", "cols_only_in_target"),
+    ("Medidas só no A", "measures_only_in_source"),
+    ("Medidas só no B", "measures_only_in_target"),
+]
+
+REPORT_COLUMNS = ["tabela", "tipo", "quantidade", "itens"]
+
+def iter_report_rows(report):
+    """Gera uma linha (dict) por tabela e tipo de alteração."""
+    lists = report["lists"]
+    for t in lists["only_in_source"]:
+        yield {"tabela": t, "tipo": "Apenas no A", "quantidade": 1, "itens": ""}
+    for t in lists["only_in_target"]:
+        yield {"tabela": t, "tipo": "Apenas no B", "quantidade": 1, "itens": ""}
+    for t, d in report["details"].items():
+        for kind, key in DETAIL_KINDS:
+            if d.get(key):
+                yield {"tabela": t, "tipo": kind, "quantidade": len(d[key]), "itens": ", ".join(d[key])}
+        if d.get("textual_diff_snippet"):
+            yield {"tabela": t, "tipo": "Diferença textual", "quantidade": len(d["textual_diff_snippet"]), "itens": ""}
+
+def iter_report_text(report):
+    """Gera as linhas do relatório em texto, uma a uma."""
+    counts = report["counts"]
+    lists = report["lists"]
+    yield f"Tabelas no Modelo A: {counts['source_total']}"
+    yield f"Tabelas no Modelo B: {counts['target_total']}"
+    yield f"Iguais: {counts['identical']}"
+    yield f"Diferentes: {counts['different']}"
+    yield f"Apenas no A: {counts['only_in_source']}"
+    yield f"Apenas no B: {counts['only_in_target']}\n"
+
+    if lists["only_in_source"]:
+        yield "Tabelas apenas no Modelo A:"
+        yield from (f"  - {t}" for t in lists["only_in_source"])
+    if lists["only_in_target"]:
+        yield "Tabelas apenas no Modelo B:"
+        yield from (f"  - {t}" for t in lists["only_in_target"])
+
+    if report["details"]:
+        yield "\nDiferenças detalhadas por tabela:"
+        for t, d in report["details"].items():
+            yield f"- {t}:"
+            for kind, key in DETAIL_KINDS:
+                if d.get(key):
+                    yield f"    • {kind}: {', '.join(d[key])}"
+
+def export_report(report, fmt: str):
+    """
+    Serializa o relatório no formato pedido ('txt', 'json' ou 'csv').
+    Retorna: (conteúdo, nome do arquivo, mime type)
+    """
+    if fmt == "json":
+        return json.dumps(report, ensure_ascii=False, indent=2), "Comparacao_Modelos.json", "application/json"
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(iter_report_rows(report))
+        return buf.getvalue(), "Comparacao_Modelos.csv", "text/csv"
+    if fmt == "txt":
+        return "\n".join(iter_report_text(report)), "Comparacao_Modelos.txt", "text/plain"
+    raise ValueError(f"Formato de relatório desconhecido: {fmt}")
+
 # ----------------------------
 # Nova função principal modular
 # ----------------------------
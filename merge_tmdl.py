@@ -1,8 +1,10 @@
 # merge_tmdl_modular.py
 
 import os
+import io
 import shutil
 import re
+import hashlib
 from pathlib import Path
 from datetime import datetime
 
@@ -37,30 +39,91 @@ def list_tmdl_files(def_tables_folder: str):
 def read_tmdl_text(path: Path):
     return path.read_text(encoding="utf-8", errors="ignore")
 
-def remove_lineage_tags(text: str):
-    return re.sub(r"^\s*lineageTag:.*?$", "", text, flags=re.MULTILINE)
+# ----------------------
+# Pipeline de normalização (linha a linha, em uma única passada)
+# ----------------------
 
-def remove_variation_blocks(text: str):
-    lines = text.splitlines()
-    new_lines = []
-    skip_mode = False
-    base_indent = None
+def iter_lines(source):
+    """
+    Aceita texto ou arquivo aberto e gera as linhas sem o terminador (\n ou \r\n).
+    Texto é quebrado só em '\\n', como um arquivo, e não nos demais separadores do splitlines().
+    """
+    if isinstance(source, str):
+        source = io.StringIO(source, newline="")
+    for line in source:
+        yield line.rstrip("\r\n")
+
+def strip_variation_blocks(lines):
+    """Remove blocos 'variation <nome>' e todas as linhas mais indentadas que o seguem."""
+    skip_indent = None
     for line in lines:
-        if not skip_mode and re.match(r"^\s*variation\s+\S+", line):
-            skip_mode = True
-            base_indent = len(line) - len(line.lstrip())
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        if skip_indent is not None:
+            if not stripped or indent > skip_indent:
+                continue
+            skip_indent = None
+        if stripped.startswith("variation") and stripped[9:10].isspace() and stripped[10:].strip():
+            skip_indent = indent
             continue
-        if skip_mode:
-            indent = len(line) - len(line.lstrip())
-            if indent <= base_indent and line.strip() != "":
-                skip_mode = False
-                new_lines.append(line)
+        yield line
+
+def strip_lineage_tags(lines):
+    for line in lines:
+        if not line.lstrip().startswith("lineageTag:"):
+            yield line
+
+def collapse_blank_lines(lines):
+    """Reduz sequências de linhas em branco a uma só e descarta as do início e do fim."""
+    pending_blank = False
+    started = False
+    for line in lines:
+        if not line.strip():
+            pending_blank = started
             continue
-        new_lines.append(line)
-    return "\n".join(new_lines)
+        if pending_blank:
+            yield ""
+            pending_blank = False
+        started = True
+        yield line
+
+def normalize_line_endings(lines):
+    """Remove '\\r' residuais e espaços no fim da linha; a saída usa sempre '\\n'."""
+    for line in lines:
+        yield line.rstrip()
+
+# Tabelas vindas de A: limpeza completa
+DEFAULT_PIPELINE = (strip_variation_blocks, strip_lineage_tags, normalize_line_endings, collapse_blank_lines)
+# Saída do merge (contém blocos de B, cujos lineageTags devem ser preservados)
+OUTPUT_PIPELINE = (normalize_line_endings, collapse_blank_lines)
+
+def normalize_lines(source, steps=DEFAULT_PIPELINE):
+    """Encadeia os transformadores sobre as linhas de 'source' (lazy, sem strings intermediárias)."""
+    lines = iter_lines(source)
+    for step in steps:
+        lines = step(lines)
+    return lines
+
+def write_lines(lines, dest):
+    """
+    Grava as linhas incrementalmente em 'dest': caminho, arquivo texto ou
+    stream binário (ex.: ZipFile.open(nome, "w")).
+    """
+    if isinstance(dest, (str, Path)):
+        with open(dest, "w", encoding="utf-8", newline="\n") as f:
+            write_lines(lines, f)
+        return
+    binary = not isinstance(dest, io.TextIOBase)
+    for line in lines:
+        out = line + "\n"
+        dest.write(out.encode("utf-8") if binary else out)
+
+def clean_table_text(text: str):
+    """Remove variations e lineageTags de uma tabela em uma única passada."""
+    return "\n".join(normalize_lines(text, (strip_variation_blocks, strip_lineage_tags)))
 
 def get_text_before_partition(text: str):
-    lines = text.splitlines()
+    lines = text.split("\n")
     new_lines = []
     for line in lines:
         if line.strip().startswith("partition "):
@@ -92,15 +155,111 @@ def extract_partition_block(text: str):
         return m.group(1).rstrip()
     return None
 
-def remove_lineage_tags_from_block(block: str):
-    return re.sub(r"^\s*lineageTag:.*?$", "", block, flags=re.MULTILINE)
+def get_table_header(text: str):
+    """Texto da tabela antes do primeiro bloco column/measure/partition."""
+    lines = text.split("\n")
+    new_lines = []
+    for line in lines:
+        if re.match(r"^\s*(column|measure|partition)\b", line):
+            break
+        new_lines.append(line)
+    return "\n".join(new_lines).rstrip()
+
+def block_fingerprint(block):
+    """Hash de um bloco já limpo (clean_table_text), ignorando espaços finais e linhas em branco."""
+    if block is None:
+        return None
+    normalized = "\n".join(l for l in normalize_lines(block, (normalize_line_endings,)) if l)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+def table_fingerprint(text: str):
+    return block_fingerprint(clean_table_text(text))
+
+def restore_object_metadata(block: str, ref_block: str):
+    """
+    Reinsere em 'block' (limpo) os metadados de B que identificam o objeto: cada lineageTag
+    logo após a mesma linha que o precede em 'ref_block' (ou, se ela não existir mais, antes
+    da primeira propriedade do bloco / ao final, nunca dentro de uma expressão), e os blocos
+    variation ao final, já que referenciam as LocalDateTables de B.
+    """
+    tags = {}
+    variations = []
+    prev = None
+    variation_indent = None
+    for line in iter_lines(ref_block):
+        stripped = line.lstrip()
+        indent = len(line) - len(stripped)
+        if variation_indent is not None:
+            if not stripped or indent > variation_indent:
+                variations.append(line)
+                continue
+            variation_indent = None
+        if stripped.startswith("variation") and stripped[9:10].isspace():
+            variation_indent = indent
+            variations.append(line)
+        elif stripped.startswith("lineageTag:"):
+            tags.setdefault(prev, []).append(line)
+        elif stripped:
+            prev = line.strip()
+
+    lines = list(iter_lines(block))
+    indents = [len(l) - len(l.lstrip()) if l.strip() else None for l in lines]
+
+    def next_indent(i):
+        return next((ind for ind in indents[i + 1:] if ind is not None), None)
+
+    after = {}
+    before = {}
+    for anchor, tag_lines in tags.items():
+        tag_indent = len(tag_lines[0]) - len(tag_lines[0].lstrip())
+        # Só ancora se a linha não for seguida de continuação mais indentada (ex.: expressão DAX)
+        pos = next(
+            (i for i, l in enumerate(lines)
+             if l.strip() == anchor and (next_indent(i) is None or next_indent(i) <= tag_indent)),
+            None,
+        )
+        if pos is not None:
+            after.setdefault(pos, []).extend(tag_lines)
+            continue
+        # Sem âncora: antes da primeira propriedade do bloco, ou ao final (após a expressão)
+        pos = next((i for i in range(1, len(lines)) if indents[i] == tag_indent), len(lines))
+        before.setdefault(pos, []).extend(tag_lines)
+
+    out = []
+    for i, line in enumerate(lines):
+        out.extend(before.get(i, []))
+        out.append(line)
+        out.extend(after.get(i, []))
+    out.extend(before.get(len(lines), []))
+    if variations:
+        out.append("")
+        out.extend(variations)
+    return "\n".join(out).rstrip()
+
+def extract_table_blocks(text: str):
+    """
+    Divide a tabela em blocos nomeados, na ordem em que aparecem:
+    'header', 'column:<nome>', 'measure:<nome>' e 'partition'.
+    """
+    blocks = {"header": get_table_header(text)}
+    starts = []
+    for name, block in extract_column_blocks(text).items():
+        starts.append((text.find(block), f"column:{name}", block))
+    for name, block in extract_measure_blocks(text).items():
+        starts.append((text.find(block), f"measure:{name}", block))
+    for pos, key, block in sorted(starts, key=lambda x: x[0]):
+        blocks[key] = block.strip("\n")
+    part = extract_partition_block(text)
+    if part:
+        blocks["partition"] = part.strip("\n")
+    return blocks
 
 # ----------------------
 # Funções de merge
 # ----------------------
 
 def merge_table(a_text: str, b_text: str):
-    a_text = remove_variation_blocks(a_text)
+    a_text = clean_table_text(a_text)
     a_cols = extract_column_blocks(a_text)
     a_meas = extract_measure_blocks(a_text)
     a_part = extract_partition_block(a_text)
@@ -113,10 +272,10 @@ def merge_table(a_text: str, b_text: str):
 
     for col_name, col_block in a_cols.items():
         if col_name not in b_cols:
-            additions.append(remove_lineage_tags_from_block(col_block).rstrip())
+            additions.append(col_block.rstrip())
     for meas_name, meas_block in a_meas.items():
         if meas_name not in b_meas:
-            additions.append(remove_lineage_tags_from_block(meas_block).rstrip())
+            additions.append(meas_block.rstrip())
 
     merged_parts = [b_before.rstrip()]
     if additions:
@@ -125,7 +284,7 @@ def merge_table(a_text: str, b_text: str):
 
     if a_part:
         merged_parts.append("")
-        merged_parts.append(remove_lineage_tags_from_block(a_part).rstrip())
+        merged_parts.append(a_part.rstrip())
     else:
         b_part = extract_partition_block(b_text)
         if b_part:
@@ -134,6 +293,64 @@ def merge_table(a_text: str, b_text: str):
 
     return "\n".join(merged_parts).rstrip() + "\n"
 
+def merge_table_3way(a_text: str, b_text: str, base_text: str):
+    """
+    Merge de três vias usando o modelo base como ancestral comum.
+    Os três lados são comparados já limpos (sem variations/lineageTags); para cada bloco
+    (alinhado por nome) só aplica o lado que mudou em relação ao base.
+    Retorna: (texto mesclado, lista de blocos em conflito). Em conflito mantém o bloco de B.
+    Se nenhum bloco de A precisar ser aplicado, o texto retornado é None.
+    """
+    a_clean = clean_table_text(a_text)
+    base_clean = clean_table_text(base_text)
+    if block_fingerprint(a_clean) == block_fingerprint(base_clean):
+        return None, []
+
+    a_blocks = extract_table_blocks(a_clean)
+    base_blocks = extract_table_blocks(base_clean)
+    b_blocks = extract_table_blocks(b_text)
+    b_clean_blocks = extract_table_blocks(clean_table_text(b_text))
+
+    merged = {}
+    conflitos = []
+    took_a = False
+
+    # Ordem: blocos de B, seguidos dos blocos novos de A (partition sempre no final)
+    keys = [k for k in b_blocks if k != "partition"]
+    keys += [k for k in a_blocks if k not in b_blocks and k != "partition"]
+    keys.append("partition")
+
+    for key in keys:
+        a_block = a_blocks.get(key)
+        b_block = b_blocks.get(key)
+        a_hash = block_fingerprint(a_block)
+        b_hash = block_fingerprint(b_clean_blocks.get(key))
+        base_hash = block_fingerprint(base_blocks.get(key))
+
+        if a_hash == base_hash or a_hash == b_hash:
+            chosen = b_block
+        elif b_hash == base_hash:
+            took_a = True
+            # Bloco já existente em B mantém lineageTags e variations de B
+            chosen = restore_object_metadata(a_block, b_block) if a_block and b_block else a_block
+        else:
+            conflitos.append(key)
+            chosen = b_block
+
+        if chosen is not None:
+            merged[key] = chosen
+
+    # Nenhum bloco de A aplicado (ex.: A e B fizeram a mesma alteração): B fica como está
+    if not took_a:
+        return None, conflitos
+
+    merged_parts = [merged.pop("header", "").rstrip()]
+    for block in merged.values():
+        merged_parts.append("")
+        merged_parts.append(block.rstrip())
+
+    return "\n".join(merged_parts).strip("\n") + "\n", conflitos
+
 def backup_folder(src_folder):
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     backup_path = Path(src_folder).parent / f"{Path(src_folder).name}_backup_{timestamp}"
@@ -142,9 +359,15 @@ def backup_folder(src_folder):
     shutil.copytree(src_folder, backup_path)
     return backup_path
 
-def merge_models(model_a_root: str, model_b_root: str, create_backup=True):
+def merge_models(model_a_root: str, model_b_root: str, create_backup=True, base_root: str = None):
     """
-    Retorna: dict com listas 'novas' e 'atualizadas' tabelas
+    Retorna: dict com listas 'novas', 'atualizadas' e 'removidas' e 'conflitos' por tabela.
+    Se base_root for informado, usa merge de três vias (base = ancestral comum de A e B):
+    - tabelas que A não alterou em relação ao base são mantidas como estão em B;
+    - tabela criada em A e em B (ausente no base) é mesclada bloco a bloco com base vazio;
+    - tabela removida em um lado e alterada no outro vira conflito (nada é alterado em B);
+    - tabela removida em A e não alterada em B é listada em 'removidas', mas não é apagada,
+      pois model.tmdl e os relacionamentos ainda a referenciam.
     """
     a_sem = find_semantic_model_folder(model_a_root)
     b_sem = find_semantic_model_folder(model_b_root)
@@ -156,6 +379,14 @@ def merge_models(model_a_root: str, model_b_root: str, create_backup=True):
     if not a_def or not b_def:
         raise FileNotFoundError("Não foi possível localizar definition/tables em A ou B")
 
+    base_map = None
+    if base_root:
+        base_sem = find_semantic_model_folder(base_root)
+        base_def = get_definition_tables_folder(base_sem) if base_sem else None
+        if not base_def:
+            raise FileNotFoundError("Não foi possível localizar definition/tables no modelo base")
+        base_map = {f.stem: f for f in list_tmdl_files(base_def)}
+
     if create_backup:
         backup_folder(b_sem)
 
@@ -167,23 +398,57 @@ def merge_models(model_a_root: str, model_b_root: str, create_backup=True):
 
     novas = []
     atualizadas = []
+    removidas = []
+    conflitos = {}
+
+    if base_map is not None:
+        for name, b_path in b_map.items():
+            if name in a_map or name not in base_map or name.startswith("LocalDateTable"):
+                continue
+            base_fp = table_fingerprint(read_tmdl_text(base_map[name]))
+            if table_fingerprint(read_tmdl_text(b_path)) == base_fp:
+                removidas.append(name)
+            else:
+                conflitos[name] = ["tabela removida em A e alterada em B"]
 
     for name, a_path in a_map.items():
         if name.startswith("LocalDateTable"):
             continue
 
-        a_text = read_tmdl_text(a_path)
-        if name in b_map:
+        # Tabelas novas são gravadas em streaming, sem carregar o texto inteiro
+        needs_text = name in b_map or (base_map is not None and name in base_map)
+        a_text = read_tmdl_text(a_path) if needs_text else None
+        if base_map is not None and name in base_map and name not in b_map:
+            if table_fingerprint(a_text) != table_fingerprint(read_tmdl_text(base_map[name])):
+                conflitos[name] = ["tabela removida em B e alterada em A"]
+            # Sem alteração em A: mantém a remoção feita em B
+            continue
+        elif base_map is not None and name in b_map:
+            base_text = read_tmdl_text(base_map[name]) if name in base_map else ""
+            b_path = b_map[name]
+            merged, table_conflicts = merge_table_3way(a_text, read_tmdl_text(b_path), base_text)
+            if table_conflicts:
+                conflitos[name] = table_conflicts
+            if merged is None:
+                continue
+            write_lines(normalize_lines(merged, OUTPUT_PIPELINE), b_path)
+            atualizadas.append(name)
+        elif name in b_map:
             b_path = b_map[name]
             b_text = read_tmdl_text(b_path)
             merged = merge_table(a_text, b_text)
-            b_path.write_text(merged, encoding="utf-8")
+            write_lines(normalize_lines(merged, OUTPUT_PIPELINE), b_path)
             atualizadas.append(name)
         else:
             destino = Path(b_def) / a_path.name
-            cleaned = remove_variation_blocks(a_text)
-            cleaned = remove_lineage_tags(cleaned)
-            destino.write_text(cleaned, encoding="utf-8")
+            with open(a_path, encoding="utf-8", errors="ignore") as src:
+                write_lines(normalize_lines(src), destino)
             novas.append(name)
 
-    return {"novas": novas, "atualizadas": atualizadas, "destino": b_def}
+    return {
+        "novas": novas,
+        "atualizadas": atualizadas,
+        "removidas": removidas,
+        "conflitos": conflitos,
+        "destino": b_def,
+    }
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+
+import pytest
+
+from compare_tmdl import compare_models, iter_report_rows, export_report, REPORT_COLUMNS
+
+
+def parsed(name, text, columns=(), measures=()):
+    return {
+        "name": name,
+        "file": f"{name}.tmdl",
+        "text": text,
+        "columns": set(columns),
+        "measures": set(measures),
+        "raw_json": None,
+    }
+
+
+@pytest.fixture
+def report():
+    source = {
+        "Sales": parsed("Sales", "a", columns=["Amount", "Date"], measures=["Total"]),
+        "Calendar": parsed("Calendar", "x\n"),
+        "OnlyA": parsed("OnlyA", "t"),
+    }
+    target = {
+        "Sales": parsed("Sales", "b", columns=["Amount"], measures=["Count"]),
+        "Calendar": parsed("Calendar", "y\n"),
+        "OnlyB": parsed("OnlyB", "t"),
+    }
+    return compare_models(source, target)
+
+
+def test_iter_report_rows(report):
+    rows = list(iter_report_rows(report))
+    assert all(list(r) == REPORT_COLUMNS for r in rows)
+    assert {"tabela": "OnlyA", "tipo": "Apenas no A", "quantidade": 1, "itens": ""} in rows
+    assert {"tabela": "OnlyB", "tipo": "Apenas no B", "quantidade": 1, "itens": ""} in rows
+    assert {"tabela": "Sales", "tipo": "Colunas só no A", "quantidade": 1, "itens": "Date"} in rows
+    assert {"tabela": "Sales", "tipo": "Medidas só no A", "quantidade": 1, "itens": "Total"} in rows
+    assert {"tabela": "Sales", "tipo": "Medidas só no B", "quantidade": 1, "itens": "Count"} in rows
+    assert [r["tipo"] for r in rows if r["tabela"] == "Calendar"] == ["Diferença textual"]
+
+
+def test_export_csv(report):
+    data, file_name, mime = export_report(report, "csv")
+    assert (file_name, mime) == ("Comparacao_Modelos.csv", "text/csv")
+    parsed_rows = list(csv.DictReader(io.StringIO(data)))
+    assert list(parsed_rows[0]) == REPORT_COLUMNS
+    assert len(parsed_rows) == len(list(iter_report_rows(report)))
+    assert {"tabela": "Sales", "tipo": "Colunas só no A", "quantidade": "1", "itens": "Date"} in parsed_rows
+
+
+def test_export_json(report):
+    data, file_name, mime = export_report(report, "json")
+    assert (file_name, mime) == ("Comparacao_Modelos.json", "application/json")
+    loaded = json.loads(data)
+    assert loaded["counts"] == report["counts"]
+    assert loaded["details"]["Sales"]["cols_only_in_source"] == ["Date"]
+
+
+def test_export_txt(report):
+    data, file_name, mime = export_report(report, "txt")
+    assert (file_name, mime) == ("Comparacao_Modelos.txt", "text/plain")
+    assert "Tabelas apenas no Modelo A:\n  - OnlyA" in data
+    assert "    • Colunas só no A: Date" in data
+
+
+def test_export_unknown_format(report):
+    with pytest.raises(ValueError, match="desconhecido"):
+        export_report(report, "xml")
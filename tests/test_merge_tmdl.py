@@ -0,0 +1,130 @@
+from pathlib import Path
+
+import pytest
+
+from merge_tmdl import merge_table_3way, merge_models
+
+BASE = """table Sales
+\tlineageTag: t1
+
+\tcolumn Date
+\t\tdataType: dateTime
+\t\tlineageTag: c1
+
+\t\tvariation Variation
+\t\t\tisDefault
+\t\t\trelationship: abc
+\t\t\tdefaultHierarchy: LocalDateTable_1.'Date Hierarchy'
+
+\tcolumn Amount
+\t\tdataType: int64
+\t\tlineageTag: c2
+
+\tpartition Sales = m
+\t\tsource = 1
+"""
+
+
+def test_variation_in_b_is_not_a_false_conflict():
+    a = BASE.replace("\t\tdataType: dateTime\n", "\t\tdataType: dateTime\n\t\tformatString: dd/mm/yyyy\n")
+    merged, conflitos = merge_table_3way(a, BASE, BASE)
+    assert conflitos == []
+    assert "formatString: dd/mm/yyyy" in merged
+    assert "lineageTag: c1" in merged
+    assert "variation Variation" in merged
+
+
+def test_existing_block_changed_in_a_keeps_lineage_tag_of_b():
+    a = BASE.replace("\t\tdataType: int64\n", "\t\tdataType: double\n")
+    merged, conflitos = merge_table_3way(a, BASE, BASE)
+    assert conflitos == []
+    assert "dataType: double" in merged
+    assert "lineageTag: c2" in merged
+
+
+def test_new_block_from_a_has_no_lineage_tag():
+    a = BASE.replace("\tpartition", "\tmeasure Total = 1\n\t\tlineageTag: m1\n\n\tpartition")
+    merged, _ = merge_table_3way(a, BASE, BASE)
+    assert "measure Total = 1" in merged
+    assert "lineageTag: m1" not in merged
+
+
+def test_block_changed_on_both_sides_is_a_conflict():
+    a = BASE.replace("int64", "double")
+    b = BASE.replace("int64", "string")
+    merged, conflitos = merge_table_3way(a, b, BASE)
+    assert conflitos == ["column:Amount"]
+    # Em conflito o bloco de B é mantido; como nada de A foi aplicado, B não é reescrito
+    assert merged is None
+
+
+def test_table_unchanged_in_a_is_skipped():
+    assert merge_table_3way(BASE, BASE.replace("int64", "double"), BASE) == (None, [])
+
+
+def _model(root: Path, tables: dict):
+    folder = root / "M.SemanticModel" / "definition" / "tables"
+    folder.mkdir(parents=True)
+    for name, text in tables.items():
+        (folder / f"{name}.tmdl").write_text(text, encoding="utf-8")
+    return root
+
+
+def test_merge_models_table_level_conflicts(tmp_path):
+    changed = BASE.replace("int64", "double")
+    base = _model(tmp_path / "base", {"Deleted": BASE, "DeletedA": BASE, "DeletedAChangedB": BASE})
+    a = _model(tmp_path / "a", {"Deleted": changed, "BothNew": BASE})
+    b = _model(tmp_path / "b", {
+        "DeletedA": BASE,
+        "DeletedAChangedB": changed,
+        "BothNew": BASE.replace("source = 1", "source = 2"),
+    })
+
+    result = merge_models(a, b, create_backup=False, base_root=base)
+
+    assert result["conflitos"]["Deleted"] == ["tabela removida em B e alterada em A"]
+    assert result["conflitos"]["DeletedAChangedB"] == ["tabela removida em A e alterada em B"]
+    assert result["conflitos"]["BothNew"] == ["partition"]
+    assert result["removidas"] == ["DeletedA"]
+    assert result["novas"] == []
+    assert not (Path(result["destino"]) / "Deleted.tmdl").exists()
+
+
+MEASURE_BASE = """table Sales
+\tlineageTag: t1
+
+\tmeasure Total =
+\t\t\tVAR a = 1
+\t\t\tRETURN a
+\t\tlineageTag: m1
+
+\tpartition Sales = m
+\t\tsource = 1
+"""
+
+
+def test_multiline_measure_edited_in_a_keeps_lineage_tag_after_expression():
+    a = MEASURE_BASE.replace("RETURN a\n", "RETURN a + 1\n")
+    merged, conflitos = merge_table_3way(a, MEASURE_BASE, MEASURE_BASE)
+    assert conflitos == []
+    assert "\tmeasure Total =\n\t\t\tVAR a = 1\n\t\t\tRETURN a + 1\n\t\tlineageTag: m1\n" in merged
+
+
+def test_multiline_measure_with_property_gets_tag_before_first_property():
+    base = MEASURE_BASE.replace("\t\tlineageTag: m1\n", "\t\tlineageTag: m1\n\t\tformatString: 0\n")
+    a = base.replace("RETURN a\n", "RETURN a + 1\n")
+    merged, _ = merge_table_3way(a, base, base)
+    assert "\t\t\tRETURN a + 1\n\t\tlineageTag: m1\n\t\tformatString: 0\n" in merged
+
+
+def test_same_change_on_both_sides_is_not_rewritten():
+    changed = BASE.replace("int64", "double")
+    assert merge_table_3way(changed, changed, BASE) == (None, [])
+
+
+def test_invalid_base_model_raises(tmp_path):
+    a = _model(tmp_path / "a", {"Sales": BASE})
+    b = _model(tmp_path / "b", {"Sales": BASE})
+    (tmp_path / "base").mkdir()
+    with pytest.raises(FileNotFoundError):
+        merge_models(a, b, create_backup=False, base_root=tmp_path / "base")
@@ -0,0 +1,101 @@
+import io
+import zipfile
+
+from merge_tmdl import (
+    iter_lines,
+    strip_variation_blocks,
+    strip_lineage_tags,
+    collapse_blank_lines,
+    normalize_line_endings,
+    normalize_lines,
+    write_lines,
+    OUTPUT_PIPELINE,
+)
+
+TABLE = (
+    "table Sales\r\n"
+    "\tlineageTag: t1\r\n"
+    "\r\n"
+    "\r\n"
+    "\tcolumn Date\r\n"
+    "\t\tdataType: dateTime   \r\n"
+    "\t\tvariation Variation\r\n"
+    "\t\t\tisDefault\r\n"
+    "\r\n"
+    "\t\t\tdefaultHierarchy: LocalDateTable_1.'Date Hierarchy'\r\n"
+    "\t\tsummarizeBy: none\r\n"
+    "\r\n"
+)
+
+
+def test_iter_lines_splits_text_like_a_file():
+    text = "a\x0bb\x0cc\x1cd\x85e f g\r\nh\ni"
+    assert list(iter_lines(text)) == list(iter_lines(io.StringIO(text, newline="")))
+    assert list(iter_lines(text)) == ["a\x0bb\x0cc\x1cd\x85e f g", "h", "i"]
+
+
+def test_strip_variation_blocks_removes_nested_lines_only():
+    lines = list(strip_variation_blocks(iter_lines(TABLE)))
+    assert not any("variation" in l or "isDefault" in l or "defaultHierarchy" in l for l in lines)
+    assert "\t\tsummarizeBy: none" in lines
+
+
+def test_strip_lineage_tags_drops_the_line():
+    assert list(strip_lineage_tags(["table X", "\tlineageTag: a", "\tcolumn C"])) == ["table X", "\tcolumn C"]
+
+
+def test_collapse_blank_lines():
+    lines = ["", "a", "", "  ", "", "b", "", ""]
+    assert list(collapse_blank_lines(lines)) == ["a", "", "b"]
+
+
+def test_normalize_line_endings():
+    assert list(normalize_line_endings(["a\r", "b  ", "\tc"])) == ["a", "b", "\tc"]
+
+
+def test_default_pipeline_in_one_pass():
+    assert list(normalize_lines(TABLE)) == [
+        "table Sales",
+        "",
+        "\tcolumn Date",
+        "\t\tdataType: dateTime",
+        "\t\tsummarizeBy: none",
+    ]
+
+
+def test_pipeline_is_lazy():
+    consumed = []
+
+    def source():
+        for line in ["table A", "\tlineageTag: x", "\tcolumn C", "\tcolumn D"]:
+            consumed.append(line)
+            yield line
+
+    lines = normalize_lines(source())
+    assert consumed == []
+    assert next(lines) == "table A"
+    assert consumed == ["table A"]
+
+
+def test_output_pipeline_keeps_lineage_tags():
+    assert "\tlineageTag: t1" in list(normalize_lines(TABLE, OUTPUT_PIPELINE))
+
+
+def test_write_lines_to_path_and_text_stream(tmp_path):
+    dest = tmp_path / "Sales.tmdl"
+    write_lines(normalize_lines(TABLE), dest)
+    assert dest.read_bytes() == b"table Sales\n\n\tcolumn Date\n\t\tdataType: dateTime\n\t\tsummarizeBy: none\n"
+
+    buf = io.StringIO()
+    write_lines(normalize_lines(TABLE), buf)
+    assert buf.getvalue() == dest.read_text(encoding="utf-8")
+
+
+def test_write_lines_to_zip_entry():
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zipf:
+        with zipf.open("tables/Sales.tmdl", "w") as entry:
+            write_lines(normalize_lines("table Vendas\n\tcolumn Preço\n"), entry)
+
+    with zipfile.ZipFile(buf) as zipf:
+        assert zipf.read("tables/Sales.tmdl") == "table Vendas\n\tcolumn Preço\n".encode("utf-8")
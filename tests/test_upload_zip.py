@@ -0,0 +1,112 @@
+import io
+import zipfile
+
+import pytest
+
+import upload_zip
+from upload_zip import save_and_extract_zip, is_tmdl_member, is_definition_member
+
+
+@pytest.fixture(autouse=True)
+def temp_root(tmp_path, monkeypatch):
+    """Extrações e .zip temporários dentro do tmp_path de cada teste."""
+    monkeypatch.setattr(upload_zip.tempfile, "tempdir", str(tmp_path))
+    return tmp_path
+
+
+class Upload(io.BytesIO):
+    """Imita o UploadedFile do Streamlit (BytesIO com 'name')."""
+
+    def __init__(self, data: bytes, name="modelo.zip"):
+        super().__init__(data)
+        self.name = name
+
+
+def make_zip(members: dict, compression=zipfile.ZIP_DEFLATED):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", compression) as zipf:
+        for name, data in members.items():
+            zipf.writestr(name, data)
+    return buf.getvalue()
+
+
+def test_extracts_only_selected_members():
+    data = make_zip({
+        "M.SemanticModel/definition/tables/Sales.tmdl": "table Sales",
+        "M.SemanticModel/definition/model.tmdl": "model Model",
+        "M.SemanticModel/.pbi/cache.abf": b"\0" * 10,
+        "M.Report/report.json": "{}",
+    })
+
+    tmdl_root = save_and_extract_zip(Upload(data), member_filter=is_tmdl_member)
+    assert sorted(p.name for p in tmdl_root.rglob("*") if p.is_file()) == ["Sales.tmdl", "model.tmdl"]
+
+    definition_root = save_and_extract_zip(Upload(data), member_filter=is_definition_member)
+    assert not (definition_root / "M.SemanticModel" / ".pbi").exists()
+    assert (definition_root / "M.SemanticModel" / "definition" / "model.tmdl").exists()
+
+
+def test_member_named_like_the_upload_is_extracted():
+    data = make_zip({"w.zip": "conteudo", "a.txt": "a"})
+    root = save_and_extract_zip(Upload(data, name="w.zip"))
+    assert (root / "w.zip").read_text() == "conteudo"
+    assert (root / "a.txt").read_text() == "a"
+
+
+def test_upload_size_limit():
+    data = make_zip({"a.tmdl": "x" * 1000}, compression=zipfile.ZIP_STORED)
+    with pytest.raises(ValueError, match="excede o limite"):
+        save_and_extract_zip(Upload(data), limits={"max_upload_bytes": 100})
+
+
+def test_member_size_limit():
+    data = make_zip({"a.tmdl": "x" * 1000}, compression=zipfile.ZIP_STORED)
+    with pytest.raises(ValueError, match="tamanho máximo por arquivo"):
+        save_and_extract_zip(Upload(data), limits={"max_member_bytes": 500})
+
+
+def test_total_size_limit():
+    data = make_zip({"a.tmdl": "x" * 600, "b.tmdl": "y" * 600}, compression=zipfile.ZIP_STORED)
+    with pytest.raises(ValueError, match="limite total"):
+        save_and_extract_zip(Upload(data), limits={"max_total_bytes": 1000})
+
+
+def test_compression_ratio_limit():
+    data = make_zip({"bomb.tmdl": b"\0" * (1024 * 1024)})
+    with pytest.raises(ValueError, match="taxa de compressão"):
+        save_and_extract_zip(Upload(data))
+
+
+def test_member_count_limit():
+    data = make_zip({f"t{i}.tmdl": "x" for i in range(11)})
+    with pytest.raises(ValueError, match="limite: 10"):
+        save_and_extract_zip(Upload(data), limits={"max_members": 10})
+
+
+def test_zip_slip_is_rejected(tmp_path):
+    data = make_zip({"../evil.tmdl": "x"})
+    with pytest.raises(ValueError, match="Caminho inválido"):
+        save_and_extract_zip(Upload(data))
+    assert not (tmp_path / "evil.tmdl").exists()
+    # Nem o diretório de extração nem o .zip temporário ficam para trás
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_large_archives_use_thread_pool(monkeypatch):
+    pools = []
+    real_executor = upload_zip.ThreadPoolExecutor
+
+    def executor(*args, **kwargs):
+        pools.append(kwargs.get("max_workers"))
+        return real_executor(*args, **kwargs)
+
+    monkeypatch.setattr(upload_zip, "ThreadPoolExecutor", executor)
+    count = upload_zip.PARALLEL_THRESHOLD + 1
+    data = make_zip({f"M.SemanticModel/definition/tables/T{i}.tmdl": f"table T{i}" for i in range(count)})
+
+    root = save_and_extract_zip(Upload(data), member_filter=is_tmdl_member)
+
+    assert pools == [upload_zip.MAX_WORKERS]
+    files = list((root / "M.SemanticModel" / "definition" / "tables").iterdir())
+    assert len(files) == count
+    assert (root / "M.SemanticModel/definition/tables/T7.tmdl").read_text() == "table T7"
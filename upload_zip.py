@@ -0,0 +1,146 @@
+"""
+upload_zip.py
+Ingestão dos arquivos .zip enviados no Streamlit: grava o upload em disco por partes
+e extrai apenas os membros selecionados, respeitando limites de tamanho, taxa de
+compressão e quantidade de arquivos.
+"""
+
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+
+# ----------------------
+# Limites padrão (podem ser sobrescritos via parâmetro 'limits')
+# ----------------------
+
+DEFAULT_LIMITS = {
+    "max_upload_bytes": 200 * 1024 * 1024,        # tamanho do .zip enviado
+    "max_total_bytes": 1024 * 1024 * 1024,        # soma descompactada dos membros extraídos
+    "max_member_bytes": 100 * 1024 * 1024,        # tamanho descompactado de cada membro
+    "max_compression_ratio": 100,                 # descompactado / compactado, por membro
+    "max_members": 20000,                         # quantidade de membros no .zip
+}
+
+CHUNK_SIZE = 1024 * 1024
+PARALLEL_THRESHOLD = 500
+MAX_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+
+# ----------------------
+# Funções utilitárias
+# ----------------------
+
+def is_tmdl_member(info: zipfile.ZipInfo):
+    return not info.is_dir() and info.filename.lower().endswith(".tmdl")
+
+def is_definition_member(info: zipfile.ZipInfo):
+    """Arquivos sob '<nome>.SemanticModel/definition/' (ignora .pbi/cache.abf e afins)."""
+    parts = PurePosixPath(info.filename).parts
+    return not info.is_dir() and any(
+        parts[i].lower().endswith(".semanticmodel") and parts[i + 1].lower() == "definition"
+        for i in range(len(parts) - 1)
+    )
+
+def stream_upload_to_disk(uploaded_file, dest_path: Path, max_bytes: int, chunk_size=CHUNK_SIZE):
+    """Copia o upload para 'dest_path' em blocos, abortando se passar de 'max_bytes'."""
+    if hasattr(uploaded_file, "seek"):
+        uploaded_file.seek(0)
+    written = 0
+    with open(dest_path, "wb") as f:
+        while True:
+            chunk = uploaded_file.read(chunk_size)
+            if not chunk:
+                break
+            written += len(chunk)
+            if written > max_bytes:
+                raise ValueError(
+                    f"Arquivo '{uploaded_file.name}' excede o limite de {max_bytes // (1024 * 1024)} MB."
+                )
+            f.write(chunk)
+    return written
+
+def check_members(members, total_members: int, limits: dict):
+    """Valida os membros selecionados contra os limites antes de descompactar qualquer coisa."""
+    if total_members > limits["max_members"]:
+        raise ValueError(f"O .zip contém {total_members} arquivos (limite: {limits['max_members']}).")
+
+    total = 0
+    for info in members:
+        if info.file_size > limits["max_member_bytes"]:
+            raise ValueError(f"'{info.filename}' excede o tamanho máximo por arquivo.")
+        if info.file_size / max(info.compress_size, 1) > limits["max_compression_ratio"]:
+            raise ValueError(f"'{info.filename}' tem taxa de compressão suspeita.")
+        total += info.file_size
+        if total > limits["max_total_bytes"]:
+            raise ValueError("O conteúdo descompactado excede o limite total permitido.")
+
+def safe_member_path(dest_dir: Path, info: zipfile.ZipInfo):
+    """Resolve o destino do membro, bloqueando caminhos que saiam de 'dest_dir' (zip slip)."""
+    target = (dest_dir / info.filename).resolve()
+    if dest_dir != target and dest_dir not in target.parents:
+        raise ValueError(f"Caminho inválido no .zip: '{info.filename}'.")
+    return target
+
+def extract_members(zip_path: Path, members, dest_dir: Path, max_member_bytes: int):
+    """Extrai uma lista de membros com um handle próprio do .zip (seguro para uso em threads)."""
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        for info in members:
+            target = safe_member_path(dest_dir, info)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            written = 0
+            with zip_ref.open(info) as src, open(target, "wb") as dst:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if written > max_member_bytes:
+                        raise ValueError(f"'{info.filename}' excede o tamanho máximo por arquivo.")
+                    dst.write(chunk)
+
+# ----------------------
+# Função principal
+# ----------------------
+
+def save_and_extract_zip(uploaded_file, member_filter=None, limits: dict = None):
+    """
+    Grava o upload em um diretório temporário e extrai os membros aceitos por
+    'member_filter' (todos, se None). Arquivos com muitos membros são extraídos
+    em paralelo. Retorna: Path do diretório temporário.
+    Levanta ValueError (ou zipfile.BadZipFile) se o arquivo violar algum limite.
+    """
+    limits = {**DEFAULT_LIMITS, **(limits or {})}
+    tmp_dir = Path(tempfile.mkdtemp()).resolve()
+    # O .zip fica fora de tmp_dir para que nenhum membro extraído possa sobrescrevê-lo
+    fd, zip_name = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    zip_path = Path(zip_name)
+
+    try:
+        stream_upload_to_disk(uploaded_file, zip_path, limits["max_upload_bytes"])
+
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            infos = zip_ref.infolist()
+        members = [i for i in infos if not i.is_dir() and (member_filter is None or member_filter(i))]
+        check_members(members, len(infos), limits)
+
+        if len(members) < PARALLEL_THRESHOLD:
+            extract_members(zip_path, members, tmp_dir, limits["max_member_bytes"])
+        else:
+            batches = [members[i::MAX_WORKERS] for i in range(MAX_WORKERS)]
+            with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+                futures = [
+                    executor.submit(extract_members, zip_path, batch, tmp_dir, limits["max_member_bytes"])
+                    for batch in batches if batch
+                ]
+                for future in futures:
+                    future.result()
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    finally:
+        zip_path.unlink(missing_ok=True)
+
+    return tmp_dir